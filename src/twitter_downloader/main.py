@@ -1,19 +1,31 @@
 import argparse
-import json
+import logging
 import os
+import random
+import sqlite3
 import sys
 import time # Added import
-from typing import List, Optional, Dict, Iterator, Any
-from datetime import datetime
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import List, Optional, Dict, Iterator, Any, BinaryIO, Set
+from datetime import datetime, timedelta
 
+import orjson
 import requests
 import requests_cache
 from dotenv import load_dotenv
-from pydantic import BaseModel, Field, ValidationError
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# Named explicitly: when run as a script __name__ is just "__main__"
+logger = logging.getLogger("twitter_downloader")
 
 
 # TODO: Define Pydantic models for User and Tweet
 class PublicMetrics(BaseModel):
+    model_config = ConfigDict(frozen=True, extra='ignore')
+
     retweet_count: int
     reply_count: int
     like_count: int
@@ -21,13 +33,27 @@ class PublicMetrics(BaseModel):
     impression_count: int
 
 class Tweet(BaseModel):
-    id: str
+    model_config = ConfigDict(frozen=True, extra='ignore') # Tweets are never modified after parsing
+
+    id: str = Field(pattern=r"^[0-9]+$") # Tweet IDs are always decimal strings
     text: str
     created_at: datetime # Use datetime object
-    public_metrics: Optional[PublicMetrics] = None # Add public metrics
+    public_metrics: PublicMetrics # Always present since we request tweet.fields=public_metrics
+
+
+class TweetsPageMeta(BaseModel):
+    next_token: Optional[str] = None
+
+
+class TweetsPage(BaseModel):
+    """A page of the user tweets timeline response, parsed and validated straight from the raw JSON bytes."""
+    data: List[Tweet] = []
+    meta: Optional[TweetsPageMeta] = None
 
 
 class User(BaseModel):
+    model_config = ConfigDict(frozen=True, extra='ignore')
+
     id: str
     name: str
     username: str
@@ -35,252 +61,469 @@ class User(BaseModel):
 
 TWITTER_API_BASE_URL = "https://api.twitter.com/2"
 
+# Rate limit (429) handling for tweet pages
+MAX_RATE_LIMIT_RETRIES = 5 # Consecutive 429s on the same page before giving up
+RATE_LIMIT_BASE_DELAY = 5 # Seconds; doubles per consecutive 429 when the API sends no wait-time headers
+RATE_LIMIT_MAX_DELAY = 60 # Seconds; cap for that backoff (before jitter)
+
+MIN_RESULTS_PER_PAGE = 5 # The API rejects smaller max_results values with a 400
+
+
+def _is_cacheable(response: requests.Response) -> bool:
+    """requests_cache filter: skips username lookups that found no user (Twitter answers those with 200 and an `errors` body)."""
+    if response.status_code != 200 or "/users/by/username/" not in response.url:
+        return True # Error statuses are already excluded by allowable_codes
+    try:
+        data = orjson.loads(response.content)
+    except orjson.JSONDecodeError:
+        return False
+    return isinstance(data, dict) and "data" in data
+
+
+def create_session(bearer_token: str) -> requests_cache.CachedSession:
+    """Creates a shared, cached session so all API calls reuse pooled keep-alive connections to the Twitter API."""
+    session = requests_cache.CachedSession(
+        'twitter_cache',
+        backend='sqlite',
+        expire_after=3600, # Cache for 1 hour by default
+        urls_expire_after={
+            '*/users/by/username/*': timedelta(days=7), # A username's user ID practically never changes
+            # Timeline pages are rarely requested twice within an expiry window (re-runs only append unseen
+            # tweets anyway), so caching them would mostly cost a SQLite write per page
+            '*/users/*/tweets': requests_cache.DO_NOT_CACHE,
+        },
+        allowable_codes=(200,), # Never cache error responses
+        filter_fn=_is_cacheable, # ...nor "user not found" lookups, so they don't stick for the 7-day expiry
+        stale_if_error=True, # Serve an expired cached response rather than failing on a transient error
+        wal=True, # Write-ahead logging, which also switches to synchronous=NORMAL (no fsync per write)
+    )
+    # Retry transient server errors at the connection level. 429 is deliberately left out:
+    # get_user_tweets waits for the rate limit window (x-rate-limit-reset) itself.
+    retries = Retry(total=5, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504])
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=20, max_retries=retries))
+    session.headers["Authorization"] = f"Bearer {bearer_token}" # Set once instead of per request
+    # No explicit Accept-Encoding: with the brotli package installed, requests already sends "gzip, deflate, br"
+    # and urllib3 decodes brotli responses transparently.
+    return session
+
 
 # Implement API fetching logic
-def get_user_id_by_username(username: str, bearer_token: str) -> Optional[str]:
+def get_user_id_by_username(username: str, session: requests.Session) -> Optional[str]:
     """Fetches the Twitter User ID for a given username using the Twitter API v2."""
-    print(f"Fetching user ID for {username}...")
+    logger.info("Fetching user ID for %s...", username)
     url = f"{TWITTER_API_BASE_URL}/users/by/username/{username}"
-    headers = {"Authorization": f"Bearer {bearer_token}"}
 
     try:
-        response = requests.get(url, headers=headers)
+        response = session.get(url)
         response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
 
-        data = response.json()
+        data = orjson.loads(response.content)
         if "data" in data and "id" in data["data"]:
             user_id = data["data"]["id"]
-            print(f"Found user ID: {user_id}")
+            logger.info("Found user ID: %s", user_id)
             return user_id
         else:
-            print(f"Could not find user ID in API response for username: {username}", file=sys.stderr)
-            print(f"API Response: {data}", file=sys.stderr)
+            logger.error("Could not find user ID in API response for username: %s", username)
+            logger.error("API Response: %s", data)
             return None
 
     except requests.exceptions.RequestException as e:
-        print(f"Error fetching user ID for {username}: {e}", file=sys.stderr)
+        logger.error("Error fetching user ID for %s: %s", username, e)
         if e.response is not None:
-            print(f"Response status: {e.response.status_code}", file=sys.stderr)
-            print(f"Response body: {e.response.text}", file=sys.stderr)
+            logger.error("Response status: %d", e.response.status_code)
+            logger.error("Response body: %s", e.response.text)
+        return None
+    except orjson.JSONDecodeError as e:
+        logger.error("Error decoding user ID response for %s: %s", username, e)
         return None
 
 
-def get_user_tweets(user_id: str, bearer_token: str, limit: Optional[int] = None, max_results_per_page: int = 100) -> Iterator[List[Tweet]]:
-    """Fetches tweets for a given user ID, yielding pages of tweets. Handles pagination, rate limits, and optional limit."""
-    print(f"Fetching tweets for user ID {user_id}...")
+def get_user_tweets(user_id: str, session: requests.Session, limit: Optional[int] = None, max_results_per_page: int = 100) -> Iterator[List[Tweet]]:
+    """Fetches tweets for a given user ID, yielding pages of tweets. Handles pagination, rate limits, and optional limit.
+
+    Raises the last requests/JSON error if fetching stops before all pages were read (including when the rate limit
+    retries run out), so callers can tell a partial download from a complete one.
+    """
+    logger.info("Fetching tweets for user ID %s...", user_id)
     tweets_fetched_count = 0 # Track total tweets fetched across pages
     next_token: Optional[str] = None
     url = f"{TWITTER_API_BASE_URL}/users/{user_id}/tweets"
-    headers = {"Authorization": f"Bearer {bearer_token}"}
 
     results_per_page = max_results_per_page
     if limit is not None and limit < results_per_page:
          # If limit is smaller than default page size, request only that many initially.
          # Subsequent requests within the loop will adjust based on remaining limit.
-         results_per_page = limit
-
-    while True:
-        # Explicitly type params for linter
-        params: Dict[str, Any] = {
-            "max_results": results_per_page,
-            "tweet.fields": "created_at,public_metrics"
-        }
-        if next_token:
-            params["pagination_token"] = next_token
-
-        print(f"Fetching page... (max_results={results_per_page}, next_token={next_token})")
-
-        try:
-            response = requests.get(url, headers=headers, params=params)
-            response.raise_for_status()
-            data = response.json()
-
-            current_page_tweets: List[Tweet] = []
-            if "data" in data:
-                for tweet_data in data["data"]:
-                    try:
-                        tweet = Tweet(**tweet_data)
-                        current_page_tweets.append(tweet)
-                        tweets_fetched_count += 1
-                        if limit is not None and tweets_fetched_count >= limit:
-                            # Stop fetching immediately if limit is reached mid-page
-                            break # Break inner loop
-                    except ValidationError as e:
-                        print(f"Skipping tweet due to validation error: {e}", file=sys.stderr)
-                        print(f"Problematic tweet data: {tweet_data}", file=sys.stderr)
-
-            if current_page_tweets:
-                yield current_page_tweets # Yield the fetched page
-
-            # Check if limit was reached after processing the page
-            if limit is not None and tweets_fetched_count >= limit:
-                print(f"Reached limit of {limit} tweets.")
-                break # Break outer loop (stop fetching pages)
-
-            if "meta" in data and "next_token" in data["meta"]:
-                next_token = data["meta"]["next_token"]
-                # Adjust results per page for the next request if near the limit
+         results_per_page = max(MIN_RESULTS_PER_PAGE, limit)
+
+    # Params shared by every page request; only rebuilt when results_per_page changes near the limit
+    base_params: Dict[str, Any] = {
+        "max_results": results_per_page,
+        "tweet.fields": "created_at,public_metrics"
+    }
+
+    def request_page() -> "Future[requests.Response]":
+        """Starts fetching the page for the current next_token/results_per_page in the background."""
+        params = base_params if not next_token else {**base_params, "pagination_token": next_token}
+        logger.info("Fetching page for user ID %s... (max_results=%d, next_token=%s)", user_id, results_per_page, next_token)
+        return executor.submit(session.get, url, params=params)
+
+    # A single worker thread fetches the next page while the caller is still
+    # processing (validating/saving) the current one, overlapping network and disk I/O.
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending_page: Optional["Future[requests.Response]"] = None
+        rate_limit_attempt = 0 # Consecutive 429 responses for the current page
+
+        while True:
+            page_request = pending_page if pending_page is not None else request_page()
+            pending_page = None
+
+            try:
+                response = page_request.result()
+                response.raise_for_status()
+                rate_limit_attempt = 0
+
+                current_page_tweets: List[Tweet] = []
+                page_next_token: Optional[str] = None
+                try:
+                    # Parse and validate the whole page in one pass, without intermediate dicts
+                    page = TweetsPage.model_validate_json(response.content)
+                    current_page_tweets = page.data
+                    page_next_token = page.meta.next_token if page.meta else None
+                except ValidationError:
+                    # Fall back to per-tweet validation so one bad tweet doesn't drop the whole page
+                    data = orjson.loads(response.content)
+                    if not isinstance(data, dict):
+                        logger.error("Unexpected page response (not a JSON object): %s", response.text)
+                        data = {}
+                    tweets_data = data.get("data")
+                    if not isinstance(tweets_data, list):
+                        tweets_data = []
+                    for tweet_data in tweets_data:
+                        # Cheap pre-check so malformed entries skip building a ValidationError
+                        tweet_id = tweet_data.get("id") if isinstance(tweet_data, dict) else None
+                        if not (isinstance(tweet_id, str) and tweet_id.isascii() and tweet_id.isdigit()):
+                            logger.warning("Skipping tweet with missing or malformed id: %r", tweet_id)
+                            logger.warning("Problematic tweet data: %s", tweet_data)
+                            continue
+                        try:
+                            current_page_tweets.append(Tweet(**tweet_data))
+                        except ValidationError as e:
+                            logger.warning("Skipping tweet due to validation error: %s", e)
+                            logger.warning("Problematic tweet data: %s", tweet_data)
+                    meta = data.get("meta")
+                    page_next_token = meta.get("next_token") if isinstance(meta, dict) else None
+
                 if limit is not None:
-                    remaining_limit = limit - tweets_fetched_count
-                    if remaining_limit <= 0:
-                         # Should not happen if limit check above works, but safety break
-                         print("Limit reached exactly.")
-                         break
-                    results_per_page = min(remaining_limit, max_results_per_page)
-            else:
-                print("No more pages found.")
-                break # No more pages
-
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching page of tweets: {e}", file=sys.stderr)
-            if e.response is not None:
-                print(f"Response status: {e.response.status_code}", file=sys.stderr)
-                print(f"Response body: {e.response.text}", file=sys.stderr)
-
-                # --- Rate Limit Handling (429) ---
-                if e.response.status_code == 429:
-                    retry_after_header = e.response.headers.get("Retry-After")
-                    wait_time = 60 # Default wait time in seconds
-                    if retry_after_header and retry_after_header.isdigit():
-                        wait_time = int(retry_after_header)
-                        print(f"Rate limit hit. Waiting for {wait_time} seconds (from Retry-After header)...", file=sys.stderr)
-                    else:
-                        # Check for x-rate-limit-reset header (Unix timestamp)
-                        reset_time_header = e.response.headers.get("x-rate-limit-reset")
-                        if reset_time_header and reset_time_header.isdigit():
-                            reset_timestamp = int(reset_time_header)
-                            current_timestamp = int(time.time())
-                            wait_time = max(0, reset_timestamp - current_timestamp) + 1 # Add 1 sec buffer
-                            print(f"Rate limit hit. Waiting until reset time: {datetime.fromtimestamp(reset_timestamp)} ({wait_time} seconds)...", file=sys.stderr)
+                    # Drop tweets past the limit if it is reached mid-page
+                    current_page_tweets = current_page_tweets[:limit - tweets_fetched_count]
+                tweets_fetched_count += len(current_page_tweets)
+
+                has_more_pages = False
+                # Check if limit was reached after processing the page
+                if limit is not None and tweets_fetched_count >= limit:
+                    logger.info("Reached limit of %d tweets.", limit)
+                elif page_next_token:
+                    next_token = page_next_token
+                    # Adjust results per page for the next request if near the limit
+                    # (never below the API minimum; extra tweets are dropped by the slice above)
+                    if limit is not None and limit - tweets_fetched_count < results_per_page:
+                        results_per_page = max(MIN_RESULTS_PER_PAGE, limit - tweets_fetched_count)
+                        base_params = {**base_params, "max_results": results_per_page}
+                    has_more_pages = True
+                else:
+                    logger.info("No more pages found.")
+
+                if has_more_pages:
+                    pending_page = request_page() # Prefetch before handing this page to the caller
+
+                if current_page_tweets:
+                    yield current_page_tweets # Yield the fetched page
+
+                if not has_more_pages:
+                    break # Limit reached or no more pages
+
+            except requests.exceptions.RequestException as e:
+                logger.error("Error fetching page of tweets: %s", e)
+                if e.response is not None:
+                    logger.error("Response status: %d", e.response.status_code)
+                    logger.error("Response body: %s", e.response.text)
+
+                    # --- Rate Limit Handling (429) ---
+                    if e.response.status_code == 429:
+                        rate_limit_attempt += 1
+                        if rate_limit_attempt > MAX_RATE_LIMIT_RETRIES:
+                            logger.error("Rate limit hit %d times in a row. Aborting.", MAX_RATE_LIMIT_RETRIES + 1)
+                            raise
+
+                        retry_after_header = e.response.headers.get("Retry-After")
+                        wait_time: float
+                        if retry_after_header and retry_after_header.isdigit():
+                            wait_time = int(retry_after_header)
+                            logger.warning("Rate limit hit. Waiting for %d seconds (from Retry-After header)...", wait_time)
                         else:
-                            print(f"Rate limit hit. No specific wait time found in headers. Waiting for default {wait_time} seconds...", file=sys.stderr)
-
-                    time.sleep(wait_time)
-                    print("Retrying request...")
-                    continue # Retry the same request
-                # --- End Rate Limit Handling ---
-
-            # For other request errors, break the loop for now
-            print("Aborting due to non-rate-limit request error.", file=sys.stderr)
-            break
-        except json.JSONDecodeError as e:
-            print(f"Error decoding JSON response: {e}", file=sys.stderr)
-            print(f"Response text: {response.text}", file=sys.stderr)
-            break
-
-    print(f"Finished fetching generator. Total tweets yielded: {tweets_fetched_count}")
+                            # Check for x-rate-limit-reset header (Unix timestamp)
+                            reset_time_header = e.response.headers.get("x-rate-limit-reset")
+                            if reset_time_header and reset_time_header.isdigit():
+                                reset_timestamp = int(reset_time_header)
+                                current_timestamp = int(time.time())
+                                wait_time = max(0, reset_timestamp - current_timestamp) + 1 # Add 1 sec buffer
+                                logger.warning("Rate limit hit. Waiting until reset time: %s (%d seconds)...", datetime.fromtimestamp(reset_timestamp), wait_time)
+                            else:
+                                # Exponential backoff with jitter, so repeated 429s wait longer and don't retry in lockstep
+                                wait_time = min(RATE_LIMIT_MAX_DELAY, RATE_LIMIT_BASE_DELAY * 2 ** (rate_limit_attempt - 1))
+                                wait_time *= 1 + random.uniform(0, 0.5)
+                                logger.warning("Rate limit hit. No specific wait time found in headers. Backing off for %.1f seconds (attempt %d/%d)...", wait_time, rate_limit_attempt, MAX_RATE_LIMIT_RETRIES)
+
+                        time.sleep(wait_time)
+                        logger.info("Retrying request...")
+                        continue # Retry the same request
+                    # --- End Rate Limit Handling ---
+
+                # For other request errors, give up on this user
+                logger.error("Aborting due to non-rate-limit request error.")
+                raise
+            except orjson.JSONDecodeError as e:
+                logger.error("Error decoding JSON response: %s", e)
+                logger.error("Response text: %s", response.text)
+                raise
+
+    logger.info("Finished fetching generator. Total tweets yielded: %d", tweets_fetched_count)
     # Removed final return, as it's a generator
 
 
-# Function to append tweets, handling duplicates and file I/O
-def append_tweets_to_json(new_tweets: List[Tweet], filename: str):
-    existing_tweets: List[Dict[str, Any]] = []
-    existing_ids = set()
+def truncate_partial_last_line(filename: str):
+    """Repairs a last line with no trailing newline (left by a run killed mid-write) so new lines start cleanly.
 
+    A complete record that only lost its newline is kept; anything else is cut off.
+    """
     try:
-        with open(filename, "r") as f:
+        with open(filename, "rb+") as f:
+            end = f.seek(0, os.SEEK_END)
+            if end == 0:
+                return
+            f.seek(end - 1)
+            if f.read(1) == b"\n":
+                return # Common case: the file ends with a complete line
+
+            # Scan backwards for the last complete line
+            keep_size = 0
+            chunk_end = end
+            while chunk_end > 0:
+                chunk_start = max(0, chunk_end - 64 * 1024)
+                f.seek(chunk_start)
+                last_newline = f.read(chunk_end - chunk_start).rfind(b"\n")
+                if last_newline != -1:
+                    keep_size = chunk_start + last_newline + 1
+                    break
+                chunk_end = chunk_start
+
+            f.seek(keep_size)
+            last_line = f.read()
             try:
-                existing_tweets = json.load(f)
-                if not isinstance(existing_tweets, list):
-                    print(f"Warning: Existing file {filename} does not contain a JSON list. Overwriting.", file=sys.stderr)
-                    existing_tweets = []
-                else:
-                    # Ensure items are dicts and have 'id'
-                    valid_existing = []
-                    for item in existing_tweets:
-                        if isinstance(item, dict) and "id" in item:
-                            existing_ids.add(item["id"])
-                            valid_existing.append(item)
-                        else:
-                            print(f"Warning: Skipping invalid item in {filename}: {item}", file=sys.stderr)
-                    existing_tweets = valid_existing # Keep only valid items
-            except json.JSONDecodeError:
-                print(f"Warning: Could not decode JSON from {filename}. Starting fresh.", file=sys.stderr)
-                existing_tweets = [] # Start fresh if file is corrupted
+                item = orjson.loads(last_line)
+            except orjson.JSONDecodeError:
+                item = None
+            if isinstance(item, dict) and "id" in item:
+                # The write was only cut off before the newline; the timeline endpoint may not return
+                # this tweet again (it only reaches the newest ~3200), so keep it
+                f.seek(end)
+                f.write(b"\n")
+                logger.warning("Warning: Added the missing newline after the last tweet in %s.", filename)
+                return
+
+            f.truncate(keep_size)
+            logger.warning("Warning: Removed a partially written line at the end of %s (its tweet is fetched again only if it is still within the timeline's newest ~3200 tweets).", filename)
     except FileNotFoundError:
-        print(f"File {filename} not found. Creating new file.")
-        existing_tweets = [] # File doesn't exist yet
-    except IOError as e:
-        print(f"Error reading file {filename}: {e}. Aborting append.", file=sys.stderr)
-        return # Don't proceed if we can't read the file
+        pass # Nothing to repair yet
 
-    # Filter new tweets to only include those not already present by ID
-    truly_new_tweets = [tweet for tweet in new_tweets if tweet.id not in existing_ids]
-    appended_count = len(truly_new_tweets)
 
-    if appended_count > 0:
-        print(f"Appending {appended_count} new tweets to {filename}...")
-        # Convert new Pydantic models to JSON-serializable dicts
-        new_tweets_data = [tweet.model_dump(mode='json') for tweet in truly_new_tweets]
-        updated_tweets = existing_tweets + new_tweets_data
-
-        try:
-            with open(filename, "w") as f:
-                json.dump(updated_tweets, f, indent=2)
-            print(f"Successfully appended tweets. Total tweets in file now: {len(updated_tweets)}")
-        except IOError as e:
-            print(f"Error writing updates to {filename}: {e}", file=sys.stderr)
-    else:
-        print(f"No new tweets to append to {filename} (duplicates found or empty page).")
+def load_seen_tweet_ids(filename: str) -> Set[str]:
+    """Reads the IDs of the tweets already saved in a JSONL file, one line at a time."""
+    seen_ids: Set[str] = set()
+    try:
+        with open(filename, "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    item = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    logger.warning("Warning: Skipping undecodable line in %s: %s", filename, line)
+                    continue
+                if isinstance(item, dict) and "id" in item:
+                    seen_ids.add(item["id"])
+                else:
+                    logger.warning("Warning: Skipping invalid item in %s: %s", filename, item)
+    except FileNotFoundError:
+        logger.info("File %s not found. Creating new file.", filename)
+    return seen_ids
 
 
-def main():
-    load_dotenv() # Load environment variables from .env file
+def _model_fields(obj: Any) -> Dict[str, Any]:
+    """orjson `default` hook: serializes nested Pydantic models straight from their field values."""
+    if isinstance(obj, BaseModel):
+        return obj.__dict__
+    raise TypeError
 
-    parser = argparse.ArgumentParser(description="Download all tweets for a given Twitter user.")
-    parser.add_argument("username", help="The Twitter username (without @) to download tweets for.")
-    parser.add_argument("--limit", type=int, default=None, help="Maximum number of tweets to download (optional).")
-    args = parser.parse_args()
 
-    username = args.username
-    limit = args.limit
+# Function to append tweets, handling duplicates and file I/O
+def append_tweets_jsonl(file: BinaryIO, seen_ids: Set[str], new_tweets: List[Tweet]):
+    """Appends the tweets not seen yet (by ID) to an open JSONL file, one tweet per line, and records their IDs."""
+    lines: List[bytes] = []
+    for tweet in new_tweets:
+        if tweet.id in seen_ids:
+            continue
+        # Our models only hold JSON-native values, datetimes (OPT_UTC_Z keeps the "Z" suffix) and nested models,
+        # so orjson can encode their field dicts directly; this is ~3x faster than model_dump() per tweet.
+        lines.append(orjson.dumps(tweet.__dict__, default=_model_fields, option=orjson.OPT_UTC_Z) + b"\n")
+        seen_ids.add(tweet.id)
+    appended_count = len(lines)
+    file.write(b"".join(lines)) # One write per page
+    file.flush()
 
-    # --- Configuration & Setup ---
-    bearer_token = os.environ.get("TWITTER_API_KEY")
-    if not bearer_token:
-        print("Error: TWITTER_API_KEY environment variable not set.", file=sys.stderr)
-        print("Please create a .env file with TWITTER_API_KEY=YOUR_BEARER_TOKEN", file=sys.stderr)
-        sys.exit(1)
+    if appended_count > 0:
+        logger.info("Appended %d new tweets to %s. Total tweets in file now: %d", appended_count, file.name, len(seen_ids))
+    else:
+        logger.info("No new tweets to append to %s (duplicates found or empty page).", file.name)
 
-    # Setup caching, ignoring pagination_token for better cache hits on timeline requests
-    print("Setting up requests_cache, ignoring 'pagination_token' parameter...")
-    requests_cache.install_cache(
-        'twitter_cache',
-        backend='sqlite',
-        expire_after=3600, # Cache for 1 hour
-        ignored_parameters=['pagination_token'] # Ignore this param for caching
+
+def open_tweets_db(filename: str) -> sqlite3.Connection:
+    """Opens the SQLite output database (one row per tweet), creating the table if needed."""
+    conn = sqlite3.connect(filename)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS tweets(id TEXT PRIMARY KEY, text TEXT, created_at TEXT, metrics_json TEXT)")
+    except sqlite3.Error:
+        conn.close()
+        raise
+    return conn
+
+
+def append_tweets_to_sqlite(new_tweets: List[Tweet], conn: sqlite3.Connection, username: str):
+    """Inserts a page of tweets in a single transaction. Tweets already in the database (by ID) are skipped.
+
+    A failed insert rolls back the page and raises sqlite3.Error.
+    """
+    rows = (
+        (
+            tweet.id,
+            tweet.text,
+            tweet.created_at.isoformat(),
+            orjson.dumps(tweet.public_metrics.model_dump()).decode(),
+        )
+        for tweet in new_tweets
     )
-    print("Using requests_cache with sqlite backend (twitter_cache.sqlite)")
+    with conn: # Commits once for the whole page
+        cursor = conn.executemany("INSERT OR IGNORE INTO tweets VALUES (?, ?, ?, ?)", rows)
+    logger.info("Inserted %d new tweets for %s (%d duplicates skipped).", cursor.rowcount, username, len(new_tweets) - cursor.rowcount)
 
-    # --- Fetching Data ----
-    user_id = get_user_id_by_username(username, bearer_token)
 
-    if not user_id:
-        sys.exit(1)
-
-    output_filename = f"{username}_tweets.json"
+def download_user_tweets(username: str, session: requests.Session, limit: Optional[int], output_format: str) -> bool:
+    """Downloads one user's tweets into their output file/database. Returns False if the download failed."""
+    tweets_db: Optional[sqlite3.Connection] = None
+    tweets_file: Optional[BinaryIO] = None
     total_tweets_processed = 0
 
     try:
+        user_id = get_user_id_by_username(username, session)
+        if not user_id:
+            return False
+
+        if output_format == "sqlite":
+            tweets_db = open_tweets_db(f"{username}_tweets.db")
+        else:
+            # Loaded once per run; the file is then only ever appended to
+            output_filename = f"{username}_tweets.jsonl"
+            truncate_partial_last_line(output_filename)
+            seen_ids = load_seen_tweet_ids(output_filename)
+            tweets_file = open(output_filename, "ab")
+
         # Iterate through pages yielded by the generator
-        print("Starting tweet fetching...")
-        for tweet_page in get_user_tweets(user_id, bearer_token, limit=limit):
-            print(f"Received page with {len(tweet_page)} tweets.")
-            append_tweets_to_json(tweet_page, output_filename)
+        logger.info("Starting tweet fetching for %s...", username)
+        for tweet_page in get_user_tweets(user_id, session, limit=limit):
+            logger.info("Received page with %d tweets for %s.", len(tweet_page), username)
+            if tweets_db is not None:
+                append_tweets_to_sqlite(tweet_page, tweets_db, username)
+            elif tweets_file is not None:
+                append_tweets_jsonl(tweets_file, seen_ids, tweet_page)
             total_tweets_processed += len(tweet_page)
             # Optional: Add a small delay between page appends if needed?
             # time.sleep(0.1)
 
-        print(f"Finished processing all pages. Total tweets processed in this run: {total_tweets_processed}")
-
+        logger.info("Finished processing all pages for %s. Total tweets processed in this run: %d", username, total_tweets_processed)
+        return True
+
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError):
+        # Already logged in detail by get_user_tweets; whatever was saved so far is kept
+        logger.error("Download for %s stopped early after %d tweets.", username, total_tweets_processed)
+        return False
+    except OSError as e:
+        logger.error("Error accessing output file for %s: %s", username, e)
+        return False
+    except sqlite3.Error as e:
+        logger.error("Tweets database error for %s: %s", username, e)
+        return False
     except Exception as e:
          # Catch potential errors during iteration/saving not caught within get_user_tweets
-         # (Requests errors and JSON errors inside get_user_tweets are already handled there)
-         print(f"An unexpected error occurred during tweet processing: {e}", file=sys.stderr)
-         # Consider printing traceback for debugging
-         import traceback
-         traceback.print_exc()
-         sys.exit(1)
+         logger.exception("An unexpected error occurred during tweet processing for %s: %s", username, e)
+         return False
+    finally:
+        if tweets_db is not None:
+            tweets_db.close()
+        if tweets_file is not None:
+            tweets_file.close()
+
+
+def main():
+    load_dotenv() # Load environment variables from .env file
+
+    parser = argparse.ArgumentParser(description="Download all tweets for one or more Twitter users.")
+    parser.add_argument("usernames", nargs="+", metavar="username", help="The Twitter username(s) (without @) to download tweets for.")
+    parser.add_argument("--limit", type=int, default=None, help="Maximum number of tweets to download per user (optional).")
+    parser.add_argument("--format", choices=["jsonl", "sqlite"], default="jsonl", help="Output format: a JSON Lines file or a SQLite database (default: jsonl).")
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument("--verbose", action="store_true", help="Log progress for every page (warnings and errors only by default).")
+    verbosity.add_argument("-q", "--quiet", action="store_true", help="Only log errors.")
+    args = parser.parse_args()
+
+    if args.verbose:
+        log_level = logging.INFO
+    elif args.quiet:
+        log_level = logging.ERROR
+    else:
+        log_level = logging.WARNING
+    logging.basicConfig(format="%(message)s", level=log_level)
+
+    # --- Configuration & Setup ---
+    bearer_token = os.environ.get("TWITTER_API_KEY")
+    if not bearer_token:
+        logger.error("Error: TWITTER_API_KEY environment variable not set.")
+        logger.error("Please create a .env file with TWITTER_API_KEY=YOUR_BEARER_TOKEN")
+        sys.exit(1)
+
+    session = create_session(bearer_token)
+    logger.info("Using requests_cache with sqlite backend (twitter_cache.sqlite)")
+
+    # --- Fetching Data ----
+    # Users are downloaded concurrently over the shared session's connection pool. All of them share
+    # the bearer token's rate limit; each worker waits out a 429 on its own in get_user_tweets.
+    # Each user gets one worker: two workers on the same output file would both append every tweet.
+    # Usernames are case-insensitive (and so are default macOS filesystems), so keep the first spelling.
+    usernames_by_key: Dict[str, str] = {}
+    for username in args.usernames:
+        usernames_by_key.setdefault(username.casefold(), username)
+    usernames = list(usernames_by_key.values())
+    failed_usernames: List[str] = []
+    with ThreadPoolExecutor(max_workers=min(8, len(usernames))) as executor:
+        futures = {executor.submit(download_user_tweets, username, session, args.limit, args.format): username for username in usernames}
+        for future in as_completed(futures):
+            if not future.result():
+                failed_usernames.append(futures[future])
+
+    if failed_usernames:
+        logger.error("Failed to download tweets for: %s", ", ".join(failed_usernames))
+        sys.exit(1)
 
     # --- Saving Data --- (Now handled incrementally)
     # No final save needed here anymore